@@ -15,19 +15,40 @@ Notes:
 """
 
 import csv
+import itertools
 import os
 import time
 import argparse
+import atexit
 import logging
+import queue
+import random
+import re
 import smtplib
-from email.message import EmailMessage
+import string
+import threading
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.message import EmailMessage, MIMEPart
+from email.policy import SMTP
 from email.utils import formataddr
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 
 # ---- Configuration ----
-DEFAULT_DELAY_SECONDS = 3      # wait between sends (throttle)
+DEFAULT_RATE = 1 / 3           # long-term send rate (messages per second)
+DEFAULT_BURST = 1              # messages allowed to go out back-to-back
 MAX_RETRIES = 3
-RETRY_BACKOFF = 5              # seconds, multiply for subsequent retries
+RETRY_BACKOFF = 5              # seconds, base for exponential backoff with jitter
+DEFAULT_MAX_PER_CONNECTION = 1000  # rotate the SMTP connection after this many sends
+DEFAULT_POOL_SIZE = 1          # parallel SMTP connections
+DEFAULT_ABORT_THRESHOLD = 0.33     # give up once this fraction of sends has failed...
+DEFAULT_ABORT_MIN_BATCH = 30       # ...but only after this many attempts
+
+# Outcomes of a send; only FAILED (session-level trouble) counts toward aborting
+SENT = 'sent'
+REFUSED = 'refused'            # server permanently rejected the recipient address
+FAILED = 'failed'
 
 # Template texts for different roles
 # ---- Configuration ----
@@ -70,57 +91,270 @@ Ayush
     }
 }
 
+# role_preference values (lowercased) -> template key; anything else is 'software'
+_ROLE_MAP = {
+    'frontend': 'frontend',
+    'front-end': 'frontend',
+    'ui': 'frontend',
+    'backend': 'backend',
+    'back-end': 'backend',
+}
+
+
+def compile_template(text):
+    """Split a `{field}` template into ("lit", text) / ("slot", name) segments."""
+    segments = []
+    for literal, field, _spec, _conv in string.Formatter().parse(text):
+        if literal:
+            segments.append(("lit", literal))
+        if field is not None:
+            segments.append(("slot", field))
+    return segments
+
+
+def make_renderer(segments):
+    """Generate a function that renders `segments` as one inlined concatenation."""
+    terms = [repr(v) if k == "lit" else f"values[{v!r}]" for k, v in segments] or ["''"]
+    source = f"def render(values):\n    return {' + '.join(terms)}\n"
+    namespace = {}
+    # literals go through repr() and slot names come from our own TEMPLATES, so this is safe
+    exec(compile(source, "<template>", "exec"), namespace)
+    return namespace["render"]
+
+
+# Generated once at import so each row is a single string concatenation
+_COMPILED_TEMPLATES = {
+    role: {part: make_renderer(compile_template(text)) for part, text in template.items()}
+    for role, template in TEMPLATES.items()
+}
+
 
 # ---- Helper functions ----
 
-def read_csv(path):
-    rows = []
+_EMAIL_RE = re.compile(r'\S+@\S+\.\S+')
+
+
+def _clean(row, key, default=''):
+    # DictReader gives None for missing trailing columns
+    return (row.get(key) or default).strip()
+
+
+def iter_rows(path):
     with open(path, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for r in reader:
-            rows.append(r)
-    return rows
+        yield from csv.DictReader(f)
 
 
-def build_message(from_name, from_email, to_email, subject, body_text, resume_path):
+def build_skeleton(from_name, from_email, resume_bytes, resume_name):
+    """Build the parts shared by every message; the resume is base64-encoded once here."""
     msg = EmailMessage()
     msg['From'] = formataddr((from_name, from_email))
-    msg['To'] = to_email
-    msg['Subject'] = subject
-    msg.set_content(body_text)
-
-    # attach resume
-    resume_path = Path(resume_path)
-    if resume_path.exists():
-        with open(resume_path, 'rb') as rf:
-            data = rf.read()
-        maintype = 'application'
-        subtype = 'pdf'
-        msg.add_attachment(data, maintype=maintype, subtype=subtype, filename=resume_path.name)
-    else:
-        raise FileNotFoundError(f"Resume not found at {resume_path}")
-
+    msg.set_content('')
+    msg.add_attachment(resume_bytes, maintype='application', subtype='pdf', filename=resume_name)
     return msg
 
 
-def send_smtp(smtp_host, smtp_port, smtp_user, smtp_pass, message, use_tls=True):
-    for attempt in range(1, MAX_RETRIES + 1):
+class MessageTemplate:
+    """Skeleton flattened to bytes once; each row splices in its own headers and text part."""
+
+    def __init__(self, skeleton):
+        raw = skeleton.as_bytes(policy=SMTP)
+        boundary = skeleton.get_boundary().encode('ascii')
+        headers_end = raw.index(b'\r\n\r\n') + 2
+        first_delim = b'--' + boundary + b'\r\n'
+        text_start = raw.index(first_delim, headers_end) + len(first_delim)
+        text_end = raw.index(b'\r\n--' + boundary, text_start)
+        self.header_prefix = raw[:headers_end]
+        self.text_prefix = raw[headers_end:text_start]
+        self.attachment_suffix = raw[text_end:]
+
+    def render(self, to_email, subject, body_text):
+        headers = EmailMessage(policy=SMTP)
+        headers['To'] = to_email
+        headers['Subject'] = subject
+        text_part = MIMEPart(policy=SMTP)
+        text_part.set_content(body_text)
+        return b''.join((
+            self.header_prefix,
+            headers.as_bytes()[:-2],  # drop the blank line ending the header block
+            self.text_prefix,
+            text_part.as_bytes(),
+            self.attachment_suffix,
+        ))
+
+
+def is_permanent_failure(exc):
+    """True for 5xx SMTP replies, which won't succeed on retry."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _resp in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code >= 500
+    return False
+
+
+class TokenBucket:
+    """Token-bucket throttle: bursts up to `capacity`, long-term `rate` msgs/sec."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, n=1):
+        # held while sleeping so concurrent workers queue up behind the limit
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens < n:
+                # leave `last` alone: the next refill credits the time slept here
+                time.sleep((n - self.tokens) / self.rate)
+            self.tokens -= n
+
+
+class SMTPSession:
+    """Single authenticated SMTP connection reused for the whole run."""
+
+    def __init__(self, smtp_host, smtp_port, smtp_user, smtp_pass, use_tls=True,
+                 max_per_connection=DEFAULT_MAX_PER_CONNECTION):
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.smtp_user = smtp_user
+        self.smtp_pass = smtp_pass
+        self.use_tls = use_tls
+        self.max_per_connection = max_per_connection
+        self.server = None
+        self.sent_count = 0
+
+    def connect(self):
+        server = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=60)
         try:
-            if use_tls:
-                server = smtplib.SMTP(smtp_host, smtp_port, timeout=60)
+            if self.use_tls:
                 server.starttls()
-            else:
-                server = smtplib.SMTP(smtp_host, smtp_port, timeout=60)
-            server.login(smtp_user, smtp_pass)
-            server.send_message(message)
-            server.quit()
-            return True
-        except Exception as e:
-            logging.exception("Send attempt %s failed: %s", attempt, e)
-            if attempt < MAX_RETRIES:
-                time.sleep(RETRY_BACKOFF * attempt)
-            else:
-                return False
+            server.login(self.smtp_user, self.smtp_pass)
+        except Exception:
+            # don't leak the socket when the handshake or login fails
+            server.close()
+            raise
+        self.server = server
+        self.sent_count = 0
+
+    def close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        finally:
+            self.server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def send(self, from_addr, to_addrs, msg_bytes):
+        for attempt in range(1, MAX_RETRIES + 1):
+            try:
+                # providers cap messages per connection, so rotate before hitting it
+                if self.server is not None and self.sent_count >= self.max_per_connection:
+                    self.close()
+                # reconnect lazily if the previous connection was dropped
+                if self.server is None:
+                    self.connect()
+                self.server.sendmail(from_addr, to_addrs, msg_bytes)
+                self.sent_count += 1
+                return SENT
+            except Exception as e:
+                logging.exception("Send attempt %s failed: %s", attempt, e)
+                # smtplib closes the socket itself on disconnects and 421 replies
+                # (to MAIL, RCPT or DATA); reconnect on the next attempt
+                if self.server is not None and self.server.sock is None:
+                    self.server = None
+                if is_permanent_failure(e):
+                    return REFUSED if isinstance(e, smtplib.SMTPRecipientsRefused) else FAILED
+                if attempt < MAX_RETRIES:
+                    # full jitter keeps parallel workers from retrying in lockstep
+                    time.sleep(random.uniform(0, RETRY_BACKOFF * (2 ** (attempt - 1))))
+                else:
+                    return FAILED
+
+
+class SMTPPool:
+    """Fixed set of SMTPSessions shared by the sender threads.
+
+    All mail goes through the single --smtp-host relay, so a few threads over
+    blocking smtplib already saturate it; an asyncio/aiosmtplib client would
+    only pay off for direct-to-MX delivery to many different hosts.
+    """
+
+    def __init__(self, size, *args, **kwargs):
+        self.sessions = [SMTPSession(*args, **kwargs) for _ in range(size)]
+        self.idle = queue.Queue()
+        for session in self.sessions:
+            self.idle.put(session)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for session in self.sessions:
+            session.close()
+
+    def send(self, from_addr, to_addrs, msg_bytes):
+        session = self.idle.get()
+        try:
+            return session.send(from_addr, to_addrs, msg_bytes)
+        finally:
+            self.idle.put(session)
+
+
+def send_one(pool, bucket, from_email, to_email, msg_bytes):
+    bucket.consume(1)
+    status = pool.send(from_email, [to_email], msg_bytes)
+    if status == SENT:
+        logging.info("Sent to %s", to_email)
+    elif status == REFUSED:
+        logging.warning("Recipient %s refused by server, skipping", to_email)
+    else:
+        logging.error("Failed to send to %s", to_email)
+    return status
+
+
+class CachedTimeFormatter(logging.Formatter):
+    """Formatter that calls strftime at most once per second instead of per record."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cached_second = None
+        self._cached_time = ''
+
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        if second != self._cached_second:
+            self._cached_second = second
+            self._cached_time = time.strftime(datefmt or self.default_time_format, self.converter(second))
+        if datefmt:
+            return self._cached_time
+        return self.default_msec_format % (self._cached_time, record.msecs)
+
+
+def setup_logging(path):
+    """Log through a queue so sender threads never block on file I/O."""
+    file_handler = logging.FileHandler(path, encoding='utf-8')
+    # only the listener thread formats records, so the formatter's cache needs no lock
+    file_handler.setFormatter(CachedTimeFormatter('%(asctime)s %(levelname)s %(message)s'))
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, file_handler)
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(QueueHandler(log_queue))
+    listener.start()
+    # stop() flushes whatever is still queued, including on early returns from main()
+    atexit.register(listener.stop)
 
 
 # ---- Main routine ----
@@ -135,13 +369,21 @@ def main():
     parser.add_argument('--smtp-port', type=int, default=int(os.getenv('SMTP_PORT', 587)), help='SMTP port')
     parser.add_argument('--smtp-user', default=os.getenv('SMTP_USER'), help='SMTP username (often same as from-email)')
     parser.add_argument('--smtp-pass', default=os.getenv('SMTP_PASS'), help='SMTP password (app password or SMTP pwd)')
-    parser.add_argument('--delay', type=float, default=DEFAULT_DELAY_SECONDS, help='Delay between sends (sec)')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='Max sustained send rate (messages/sec)')
+    parser.add_argument('--burst', type=float, default=DEFAULT_BURST, help='Max messages sent back-to-back')
+    parser.add_argument('--max-per-connection', type=int, default=DEFAULT_MAX_PER_CONNECTION,
+                        help='Reconnect to the SMTP server after this many sends')
+    parser.add_argument('--pool-size', type=int, default=DEFAULT_POOL_SIZE,
+                        help='Number of parallel SMTP connections (mind provider limits)')
+    parser.add_argument('--abort-threshold', type=float, default=DEFAULT_ABORT_THRESHOLD,
+                        help='Abort the run when the failed fraction of sends exceeds this')
+    parser.add_argument('--abort-min-batch', type=int, default=DEFAULT_ABORT_MIN_BATCH,
+                        help='Minimum sends attempted before --abort-threshold applies')
     parser.add_argument('--dry-run', action='store_true', help='Only preview messages, do not send')
     parser.add_argument('--send', action='store_true', help='Actually send emails (requires SMTP settings)')
     args = parser.parse_args()
 
-    logging.basicConfig(filename='email_send.log', level=logging.INFO,
-                        format='%(asctime)s %(levelname)s %(message)s')
+    setup_logging('email_send.log')
     logging.info("Starting email run. dry_run=%s, send=%s", args.dry_run, args.send)
 
     # Basic credential checks if sending
@@ -150,57 +392,94 @@ def main():
             logging.error("SMTP credentials or from-email not provided. Set --smtp-user --smtp-pass --from-email or env vars.")
             print("Missing SMTP settings (SMTP_USER, SMTP_PASS, or FROM_EMAIL). Aborting.")
             return
+    if args.rate <= 0 or args.burst < 1:
+        parser.error('--rate must be positive and --burst at least 1')
+    if args.max_per_connection < 1:
+        parser.error('--max-per-connection must be at least 1')
+    if args.pool_size < 1:
+        parser.error('--pool-size must be at least 1')
+
+    # the resume can't change mid-run, so validate it once up front
+    resume_path = Path(args.resume).resolve()
+    if not resume_path.is_file():
+        logging.error("Resume file error: not found at %s", resume_path)
+        print(f"Resume not found at {resume_path}")
+        return
 
-    rows = read_csv(args.csv)
-    if not rows:
+    rows = iter_rows(args.csv)
+    first = next(rows, None)
+    if first is None:
         print("No rows found in CSV. Aborting.")
         return
-
-    for i, r in enumerate(rows, start=1):
-        to_email = (r.get('email') or '').strip()
-        company = (r.get('company') or 'Company').strip()
-        contact_name = (r.get('contact_name') or '').strip() or 'Hiring Team'
-        preferred = (r.get('role_preference') or '').strip().lower()
-        subject_override = (r.get('subject') or '').strip()
-
-        if not to_email:
-            logging.warning("Row %d missing email, skipping", i)
-            continue
-
-        # pick template
-        role = 'software'
-        if preferred in ('frontend', 'front-end', 'ui'):
-            role = 'frontend'
-        elif preferred in ('backend', 'back-end'):
-            role = 'backend'
-
-        template = TEMPLATES.get(role)
-        subject = subject_override if subject_override else template['subject'].format(company=company)
-        body = template['body'].format(contact_name=contact_name, company=company)
-
-        try:
-            msg = build_message(args.from_name, args.from_email, to_email, subject, body, args.resume)
-        except FileNotFoundError as fe:
-            logging.error("Resume file error: %s", fe)
-            print(fe)
-            return
-
-        # Preview / dry-run
-        if args.dry_run or not args.send:
-            print("----------")
-            print(f"To: {to_email}")
-            print(f"Subject: {subject}")
-            print(body)
-            print("Attachment:", args.resume)
-            logging.info("Previewed email to %s (%s)", to_email, company)
-        else:
-            success = send_smtp(args.smtp_host, args.smtp_port, args.smtp_user, args.smtp_pass, msg)
-            if success:
-                logging.info("Sent to %s", to_email)
+    rows = itertools.chain((first,), rows)
+
+    # dry runs only preview text, so skip reading and encoding the resume
+    template_msg = None
+    if args.send and not args.dry_run:
+        resume_bytes = resume_path.read_bytes()
+        template_msg = MessageTemplate(build_skeleton(args.from_name, args.from_email, resume_bytes,
+                                                      resume_path.name))
+
+    bucket = TokenBucket(args.rate, args.burst)
+
+    # sessions connect lazily on their first send, so dry runs never touch the network;
+    # the executor exits first, letting in-flight sends finish before the pool closes
+    with SMTPPool(args.pool_size, args.smtp_host, args.smtp_port, args.smtp_user, args.smtp_pass,
+                  max_per_connection=args.max_per_connection) as pool, \
+            ThreadPoolExecutor(max_workers=args.pool_size) as executor:
+        pending = set()
+        outcomes = Counter()
+        for i, r in enumerate(rows, start=1):
+            to_email = _clean(r, 'email')
+            company = _clean(r, 'company', 'Company')
+            contact_name = _clean(r, 'contact_name') or 'Hiring Team'
+            preferred = _clean(r, 'role_preference').lower()
+            subject_override = _clean(r, 'subject')
+
+            if not to_email:
+                logging.warning("Row %d missing email, skipping", i)
+                continue
+            if not _EMAIL_RE.fullmatch(to_email):
+                logging.warning("Row %d has malformed email %r, skipping", i, to_email)
+                continue
+
+            # pick template
+            role = _ROLE_MAP.get(preferred, 'software')
+            template = _COMPILED_TEMPLATES[role]
+            values = {'contact_name': contact_name, 'company': company}
+            subject = subject_override if subject_override else template['subject'](values)
+            body = template['body'](values)
+
+            # Preview / dry-run
+            if args.dry_run or not args.send:
+                print("----------")
+                print(f"To: {to_email}")
+                print(f"Subject: {subject}")
+                print(body)
+                print("Attachment:", args.resume)
+                logging.info("Previewed email to %s (%s)", to_email, company)
             else:
-                logging.error("Failed to send to %s after retries", to_email)
-
-            time.sleep(args.delay)
+                # bound in-flight sends so rows are still streamed, not queued up front
+                if len(pending) >= args.pool_size * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    outcomes.update(future.result() for future in done)
+
+                    # fail fast on bad credentials / blocked IP instead of retrying every row;
+                    # refused recipients are a dirty CSV, not a broken session
+                    attempted = sum(outcomes.values())
+                    sent_fail = outcomes[FAILED]
+                    if attempted >= args.abort_min_batch and sent_fail / attempted > args.abort_threshold:
+                        logging.error("Aborting: %d of %d sends failed", sent_fail, attempted)
+                        print(f"Aborting: {sent_fail} of {attempted} sends failed. See email_send.log.")
+                        for future in pending:
+                            future.cancel()
+                        break
+                msg_bytes = template_msg.render(to_email, subject, body)
+                pending.add(executor.submit(send_one, pool, bucket, args.from_email, to_email, msg_bytes))
+
+    outcomes.update(future.result() for future in pending if not future.cancelled())
+    if args.send and not args.dry_run:
+        logging.info("Sent %d, refused %d, failed %d", outcomes[SENT], outcomes[REFUSED], outcomes[FAILED])
 
     logging.info("Run complete.")
 